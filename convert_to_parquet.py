@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+# One-off conversion of the CSV inputs to Parquet for streamlit_app.py.
+# Parquet keeps the parsed dates and narrowed dtypes, so the dashboard reads
+# them back as-is instead of tokenizing and type-inferring the CSVs.
+# Rerun this whenever either CSV changes.
+
+data = pd.read_csv(
+    'NoA-Connect-JrDataScience-Case(in).csv',  # Original dataframe with order_date, currency, and purchase_amount
+    parse_dates=['order_date']
+).sort_values('order_date', ignore_index=True)  # Stored sorted so date filters can slice with searchsorted
+data.to_parquet('transactions.parquet', index=False)
+
+customer_features_clustered = pd.read_csv(
+    'customer_features_clustered.csv',  # Dataframe with features and clusters
+    parse_dates=['first_purchase', 'last_purchase'],
+    # Narrower dtypes halve the memory the per-customer filters and means walk over
+    dtype={
+        'recency': np.int32,
+        'frequency': np.int32,
+        'monetary': np.float32,
+        'purchase_variability': np.float32,
+        'tenure_days': np.int32,
+        'cluster': np.int8
+    }
+)
+customer_features_clustered.to_parquet('customer_features_clustered.parquet', index=False)
@@ -4,8 +4,6 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 # Page configuration
 st.set_page_config(
@@ -14,19 +12,195 @@ st.set_page_config(
     layout="wide"
 )
 
+# Chart colour for each customer segment, shared by every figure
+SEGMENT_COLORS = {
+    "High-Value Loyalists": "#1f77b4",
+    "Occasional Buyers": "#ff7f0e"
+}
+
 # Load your dataframes
-# Assuming these are already loaded in your environment
-# If not, you'll need to add code to load them from files
-data = pd.read_csv('NoA-Connect-JrDataScience-Case(in).csv')  # Original dataframe with order_date, currency, and purchase_amount
-customer_features_clustered = pd.read_csv('customer_features_clustered.csv')  # Dataframe with features and clusters
-data['order_date'] = pd.to_datetime(data['order_date'])
-
-# Make sure date columns in customer_features are also datetime if needed
-if 'first_purchase' in customer_features_clustered.columns:
-    customer_features_clustered['first_purchase'] = pd.to_datetime(customer_features_clustered['first_purchase'])
+# Parquet copies of the CSVs, written by convert_to_parquet.py with dates parsed,
+# dtypes narrowed and transactions sorted by order_date.
+# Cached so they are read once instead of on every widget interaction
+@st.cache_data
+def load_data():
+    # All columns are kept: the raw Transaction Data table shows every one of them
+    data = pd.read_parquet('transactions.parquet')  # Original dataframe with order_date, currency, and purchase_amount
+    customer_features_clustered = pd.read_parquet('customer_features_clustered.parquet')  # Dataframe with features and clusters
+
+    # Two known segments, so groupbys can index straight into the category codes
+    customer_features_clustered['cluster'] = pd.Categorical(customer_features_clustered['cluster'], categories=[0, 1])
+
+    # The customer codes below index straight into customer_features_clustered, so an
+    # unknown or duplicated customer_id would silently flag the wrong customer
+    if not customer_features_clustered['customer_id'].is_unique:
+        raise ValueError("customer_features_clustered has duplicate customer_id values")
+    unknown_customers = ~data['customer_id'].isin(customer_features_clustered['customer_id'])
+    if unknown_customers.any():
+        raise ValueError(
+            f"{unknown_customers.sum()} transactions have a customer_id missing from customer_features_clustered"
+        )
+
+    # Categories follow customer_features_clustered's row order, so a transaction's
+    # customer code is also the row position of that customer's features
+    data['customer_id'] = pd.Categorical(data['customer_id'], categories=customer_features_clustered['customer_id'])
+
+    # Cluster assignments are static, so attach them to each transaction once here
+    cluster_map = customer_features_clustered.set_index('customer_id')['cluster']
+    data['cluster'] = data['customer_id'].map(cluster_map)
+
+    # Whole-dataset baselines for the KPI deltas; they never change between reruns
+    overall = {
+        'total_rev': data['purchase_amount'].sum(),
+        'avg_order': data['purchase_amount'].mean(),
+        'avg_freq': customer_features_clustered['frequency'].mean(),
+        'n_customers': len(customer_features_clustered)
+    }
+    return data, customer_features_clustered, overall
+
+# Monthly revenue/customers/AOV per cluster, shared by all three time series tabs.
+# The leading underscore keeps Streamlit from hashing the frame; the date range
+# it was filtered with is the cache key instead. The cache is shared by all sessions,
+# so it is bounded rather than keeping every date range ever picked.
+@st.cache_data(max_entries=32)
+def monthly_agg(_filtered_data, start_date, end_date):
+    # Group on an int32 month number (months since 1970) rather than Period objects
+    filtered_data_with_cluster = _filtered_data.assign(
+        year_month=_filtered_data['order_date'].to_numpy().astype('datetime64[M]').astype('int32')
+    )
+    # Skip the groupby sort over all transactions; only the small result is sorted,
+    # which keeps the segment order in the chart legends stable
+    keys = ['year_month', 'cluster']
+    grouped = filtered_data_with_cluster.groupby(keys, sort=False, observed=True)
+    # Distinct customers per group come from dropping repeat purchases and counting
+    # rows, which avoids the per-group Python sets behind nunique
+    unique_customers = (
+        filtered_data_with_cluster.drop_duplicates(keys + ['customer_id'])
+        .groupby(keys, sort=False, observed=True)
+        .size()
+    )
+    monthly_data = pd.DataFrame({
+        'total_revenue': grouped['purchase_amount'].sum(),
+        'avg_order_value': grouped['purchase_amount'].mean(),
+        'unique_customers': unique_customers,
+        'order_count': grouped.size()
+    }).sort_index().reset_index()
+
+    monthly_data['year_month'] = monthly_data['year_month'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+    # Segment names up front so the line charts get the right legend entries directly
+    monthly_data['Segment'] = monthly_data['cluster'].map({
+        1: "High-Value Loyalists",
+        0: "Occasional Buyers"
+    })
+    return monthly_data
+
+# Figures are cached on the filter state that produced their input, so reruns that
+# don't change the filters (e.g. toggling the raw data tables) reuse them as-is.
+# Bounded like monthly_agg, since every distinct filter state adds pickled figures
+@st.cache_data(max_entries=32)
+def build_segment_figs(_filtered_customers, start_date, end_date, cluster_filter):
+    # Count customers in each cluster
+    # value_counts on a categorical counts the codes directly; it also reports
+    # deselected segments with a count of zero, which are dropped
+    cluster_counts = (
+        _filtered_customers['cluster']
+        .cat.rename_categories({1: "High-Value Loyalists", 0: "Occasional Buyers"})
+        .value_counts()
+        .loc[lambda counts: counts > 0]
+        .rename_axis('Segment')
+        .reset_index(name='Count')
+    )
+    cluster_counts['Percentage'] = cluster_counts['Count'] / cluster_counts['Count'].sum() * 100
+    
+    # Create donut chart
+    distribution_fig = px.pie(
+        cluster_counts, 
+        values='Count', 
+        names='Segment',
+        hole=0.4,
+        color='Segment',
+        color_discrete_map=SEGMENT_COLORS
+    )
+    distribution_fig.update_traces(textposition='inside', textinfo='percent+label')
+    distribution_fig.update_layout(height=400)
+    
+    # Calculate average metrics for each cluster
+    # Removed 'customer_value_score' since it doesn't exist
+    cluster_metrics = _filtered_customers.groupby('cluster', observed=True).agg({
+        'monetary': 'mean',
+        'frequency': 'mean',
+        'recency': 'mean'
+    }).reset_index()
+    
+    cluster_metrics['Segment'] = cluster_metrics['cluster'].map({
+        1: "High-Value Loyalists",
+        0: "Occasional Buyers"
+    })
+    
+    # Create radar chart - modified to use only available columns
+    categories = ['Monetary Value', 'Purchase Frequency', 'Recency']
+    
+    radar_fig = go.Figure()
+    
+    # Normalize values for better visualization, all segments at once
+    metrics = cluster_metrics[['monetary', 'frequency', 'recency']]
+    metrics_norm = (metrics / metrics.max()).to_numpy(dtype=float)
+    # Invert recency so lower is better
+    metrics_norm[:, 2] = 1 - metrics_norm[:, 2]
+    
+    for i in range(len(cluster_metrics)):
+        radar_fig.add_trace(go.Scatterpolar(
+            r=metrics_norm[i],
+            theta=categories,
+            fill='toself',
+            name=cluster_metrics['Segment'].iat[i],
+            line_color=SEGMENT_COLORS[cluster_metrics['Segment'].iat[i]]
+        ))
+    
+    radar_fig.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 1]
+            )),
+        showlegend=True,
+        height=400
+    )
     
-if 'last_purchase' in customer_features_clustered.columns:
-    customer_features_clustered['last_purchase'] = pd.to_datetime(customer_features_clustered['last_purchase'])
+    return distribution_fig, radar_fig
+
+# One line per segment, built straight with graph_objects to skip px.line's
+# dataframe-wrangling overhead
+def segment_line_fig(monthly_data, y, y_title):
+    fig = go.Figure()
+    for segment, segment_data in monthly_data.groupby('Segment', observed=True):
+        fig.add_trace(go.Scatter(
+            x=segment_data['year_month'],
+            y=segment_data[y],
+            mode='lines',
+            name=segment,
+            line_color=SEGMENT_COLORS[segment]
+        ))
+    fig.update_layout(
+        xaxis_title="Month",
+        yaxis_title=y_title,
+        legend_title="Customer Segment",
+        hovermode="x unified"
+    )
+    return fig
+
+# All three tabs' figures come from the same monthly data, so they are built together
+@st.cache_data(max_entries=32)
+def build_trend_figs(_monthly_data, start_date, end_date):
+    # Revenue over time by segment
+    revenue_fig = segment_line_fig(_monthly_data, 'total_revenue', "Total Revenue ($)")
+    # Active customers over time by segment
+    customers_fig = segment_line_fig(_monthly_data, 'unique_customers', "Number of Active Customers")
+    # Average order value over time by segment
+    aov_fig = segment_line_fig(_monthly_data, 'avg_order_value', "Average Order Value ($)")
+    return revenue_fig, customers_fig, aov_fig
+
+data, customer_features_clustered, overall = load_data()
 
 # Title and description
 st.title("Customer Segmentation Analysis Dashboard")
@@ -60,40 +234,55 @@ date_range = st.sidebar.date_input(
 
 if len(date_range) == 2:
     start_date, end_date = date_range
-    filtered_data = data[(data['order_date'].dt.date >= start_date) & 
-                         (data['order_date'].dt.date <= end_date)]
-    # Assuming there's a customer_id in both dataframes to join on
+    # data is sorted by order_date, so the range is a contiguous slice
+    lo, hi = np.searchsorted(
+        data['order_date'].to_numpy(),
+        [np.datetime64(start_date), np.datetime64(end_date) + np.timedelta64(1, 'D')]
+    )
+    filtered_data = data.iloc[lo:hi]
+    # Flag customers with a purchase in range straight from the customer codes,
+    # no hashing of customer_id strings needed
+    purchased_in_range = np.zeros(len(customer_features_clustered), dtype=bool)
+    purchased_in_range[filtered_data['customer_id'].cat.codes.to_numpy()] = True
     filtered_customers = customer_features_clustered[
-        customer_features_clustered['customer_id'].isin(filtered_data['customer_id'].unique()) &
+        purchased_in_range &
         customer_features_clustered['cluster'].isin(cluster_filter)
     ]
 else:
-    filtered_data = data.copy()
+    start_date, end_date = min_date, max_date
+    filtered_data = data  # Only read from below, so no copy is needed
     filtered_customers = customer_features_clustered[
         customer_features_clustered['cluster'].isin(cluster_filter)
     ]
 
+# Nothing to aggregate or plot, so stop before any of the work below
+if filtered_data.empty or not cluster_filter:
+    st.info("No data for the current filters. Select at least one customer segment or widen the date range.")
+    st.stop()
+
 # Main dashboard
 # Top row with KPIs
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
+    # customer_features_clustered has one row per customer, so row counts are customer counts
     st.metric(
         "Total Customers",
-        f"{filtered_customers['customer_id'].nunique():,}",
-        f"{filtered_customers['customer_id'].nunique() / customer_features_clustered['customer_id'].nunique() * 100:.1f}%"
+        f"{len(filtered_customers):,}",
+        f"{len(filtered_customers) / overall['n_customers'] * 100:.1f}%"
     )
 
 with col2:
+    total_revenue = filtered_data['purchase_amount'].sum()
     st.metric(
         "Total Revenue",
-        f"${filtered_data['purchase_amount'].sum():,.2f}",
-        f"{filtered_data['purchase_amount'].sum() / data['purchase_amount'].sum() * 100:.1f}%"
+        f"${total_revenue:,.2f}",
+        f"{total_revenue / overall['total_rev'] * 100:.1f}%"
     )
 
 with col3:
     avg_order_value = filtered_data['purchase_amount'].mean()
-    overall_avg = data['purchase_amount'].mean()
+    overall_avg = overall['avg_order']
     st.metric(
         "Average Order Value",
         f"${avg_order_value:.2f}",
@@ -102,7 +291,7 @@ with col3:
 
 with col4:
     avg_frequency = filtered_customers['frequency'].mean()
-    overall_freq = customer_features_clustered['frequency'].mean()
+    overall_freq = overall['avg_freq']
     st.metric(
         "Average Purchase Frequency",
         f"{avg_frequency:.2f}",
@@ -112,207 +301,47 @@ with col4:
 # Row with cluster distribution and monetary value by cluster
 row2_col1, row2_col2 = st.columns(2)
 
+distribution_fig, radar_fig = build_segment_figs(filtered_customers, start_date, end_date, tuple(cluster_filter))
+
 with row2_col1:
     st.subheader("Customer Segment Distribution")
-    
-    # Count customers in each cluster
-    cluster_counts = filtered_customers['cluster'].value_counts().reset_index()
-    cluster_counts.columns = ['Cluster', 'Count']
-    cluster_counts['Segment'] = cluster_counts['Cluster'].map({
-        1: "High-Value Loyalists",
-        0: "Occasional Buyers"
-    })
-    cluster_counts['Percentage'] = cluster_counts['Count'] / cluster_counts['Count'].sum() * 100
-    
-    # Create donut chart
-    fig = px.pie(
-        cluster_counts, 
-        values='Count', 
-        names='Segment',
-        hole=0.4,
-        color='Segment',
-        color_discrete_map={
-            "High-Value Loyalists": "#1f77b4",
-            "Occasional Buyers": "#ff7f0e"
-        }
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(height=400)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(distribution_fig, use_container_width=True)
 
 with row2_col2:
     st.subheader("Average Metrics by Segment")
-    
-    # Calculate average metrics for each cluster
-    # Removed 'customer_value_score' since it doesn't exist
-    cluster_metrics = filtered_customers.groupby('cluster').agg({
-        'monetary': 'mean',
-        'frequency': 'mean',
-        'recency': 'mean'
-    }).reset_index()
-    
-    cluster_metrics['Segment'] = cluster_metrics['cluster'].map({
-        1: "High-Value Loyalists",
-        0: "Occasional Buyers"
-    })
-    
-    # Create radar chart - modified to use only available columns
-    categories = ['Monetary Value', 'Purchase Frequency', 'Recency']
-    
-    fig = go.Figure()
-    
-    for i, row in cluster_metrics.iterrows():
-        # Normalize values for better visualization
-        monetary_norm = row['monetary'] / cluster_metrics['monetary'].max()
-        frequency_norm = row['frequency'] / cluster_metrics['frequency'].max()
-        # Invert recency so lower is better
-        recency_norm = 1 - (row['recency'] / cluster_metrics['recency'].max())
-        
-        fig.add_trace(go.Scatterpolar(
-            r=[monetary_norm, frequency_norm, recency_norm],
-            theta=categories,
-            fill='toself',
-            name=row['Segment'],
-            line_color="#1f77b4" if row['cluster'] == 1 else "#ff7f0e"
-        ))
-    
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, 1]
-            )),
-        showlegend=True,
-        height=400
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(radar_fig, use_container_width=True)
 
 # Time series analysis
 st.subheader("Purchase Patterns Over Time")
 
 # Group data by month and cluster
-filtered_data_with_cluster = filtered_data.merge(
-    customer_features_clustered[['customer_id', 'cluster']],
-    on='customer_id',
-    how='left'
-)
-
-filtered_data_with_cluster['year_month'] = filtered_data_with_cluster['order_date'].dt.to_period('M')
-monthly_data = filtered_data_with_cluster.groupby(['year_month', 'cluster']).agg({
-    'purchase_amount': ['sum', 'mean'],
-    'customer_id': 'nunique',
-    'order_date': 'count'
-}).reset_index()
-
-monthly_data.columns = ['year_month', 'cluster', 'total_revenue', 'avg_order_value', 'unique_customers', 'order_count']
-monthly_data['year_month'] = monthly_data['year_month'].dt.to_timestamp()
+monthly_data = monthly_agg(filtered_data, start_date, end_date)
 
 # Tab layout for time series visualization
 ts_tab1, ts_tab2, ts_tab3 = st.tabs(["Revenue Trends", "Customer Activity", "Average Order Value"])
 
+revenue_fig, customers_fig, aov_fig = build_trend_figs(monthly_data, start_date, end_date)
+
 with ts_tab1:
-    # Revenue over time by segment
-    revenue_fig = px.line(
-        monthly_data,
-        x='year_month',
-        y='total_revenue',
-        color='cluster',
-        color_discrete_map={1: "#1f77b4", 0: "#ff7f0e"},
-        labels={
-            'year_month': 'Month',
-            'total_revenue': 'Total Revenue ($)',
-            'cluster': 'Customer Segment'
-        }
-    )
-    
-    revenue_fig.update_layout(
-        xaxis_title="Month",
-        yaxis_title="Total Revenue ($)",
-        legend_title="Customer Segment",
-        hovermode="x unified"
-    )
-    
-    # Update legend item names
-    revenue_fig.for_each_trace(
-        lambda t: t.update(
-            name="High-Value Loyalists" if t.name == "1" else "Occasional Buyers" if t.name == "0" else t.name
-        )
-    )
-    
     st.plotly_chart(revenue_fig, use_container_width=True)
 
 with ts_tab2:
-    # Active customers over time by segment
-    customers_fig = px.line(
-        monthly_data,
-        x='year_month',
-        y='unique_customers',
-        color='cluster',
-        color_discrete_map={1: "#1f77b4", 0: "#ff7f0e"},
-        labels={
-            'year_month': 'Month',
-            'unique_customers': 'Active Customers',
-            'cluster': 'Customer Segment'
-        }
-    )
-    
-    customers_fig.update_layout(
-        xaxis_title="Month",
-        yaxis_title="Number of Active Customers",
-        legend_title="Customer Segment",
-        hovermode="x unified"
-    )
-    
-    # Update legend item names
-    customers_fig.for_each_trace(
-        lambda t: t.update(
-            name="High-Value Loyalists" if t.name == "1" else "Occasional Buyers" if t.name == "0" else t.name
-        )
-    )
-    
     st.plotly_chart(customers_fig, use_container_width=True)
 
 with ts_tab3:
-    # Average order value over time by segment
-    aov_fig = px.line(
-        monthly_data,
-        x='year_month',
-        y='avg_order_value',
-        color='cluster',
-        color_discrete_map={1: "#1f77b4", 0: "#ff7f0e"},
-        labels={
-            'year_month': 'Month',
-            'avg_order_value': 'Average Order Value ($)',
-            'cluster': 'Customer Segment'
-        }
-    )
-    
-    aov_fig.update_layout(
-        xaxis_title="Month",
-        yaxis_title="Average Order Value ($)",
-        legend_title="Customer Segment",
-        hovermode="x unified"
-    )
-    
-    # Update legend item names
-    aov_fig.for_each_trace(
-        lambda t: t.update(
-            name="High-Value Loyalists" if t.name == "1" else "Occasional Buyers" if t.name == "0" else t.name
-        )
-    )
-    
     st.plotly_chart(aov_fig, use_container_width=True)
 
 # Show raw data tables
 if st.checkbox("Show Raw Data"):
+    # Only the first rows are sent to the browser; the full tables can be tens of thousands of rows
+    max_rows = st.number_input("Rows to show", min_value=10, max_value=len(data), value=1000, step=100)
     tab1, tab2 = st.tabs(["Customer Metrics", "Transaction Data"])
     
     with tab1:
-        st.dataframe(filtered_customers)
+        st.dataframe(filtered_customers.head(max_rows))
     
     with tab2:
-        st.dataframe(filtered_data)
+        st.dataframe(filtered_data.head(max_rows))
 
 # Add a footer
 st.markdown("---")